@@ -1,8 +1,18 @@
 import os
+import copy
+import atexit
 import json
+import zlib
+import orjson
+import hashlib
+import http.cookiejar
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, render_template, request, jsonify
 from dotenv import load_dotenv
 import requests
+from requests.adapters import HTTPAdapter
 
 from centris_analyzer import analyser_centris
 
@@ -15,6 +25,37 @@ app.config["MAX_CONTENT_LENGTH"] = 15 * 1024 * 1024  # 15 MB
 FORM_POST_URL = (os.environ.get("FORM_POST_URL", "") or "").strip()
 FORM_FIELDS_JSON = os.environ.get("FORM_FIELDS_JSON", "{}")
 
+# ✅ Session partagée: keep-alive + pool de connexions (Centris, Google Forms)
+# -> pas de nouveau handshake TCP/TLS à chaque requête
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=0))
+# ✅ Pool seulement, pas d'état: aucun cookie (Centris, Google) gardé d'un utilisateur/thread à l'autre
+SESSION.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+atexit.register(SESSION.close)
+
+# En-têtes navigateur pour Centris (construits une seule fois)
+CENTRIS_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/121.0.0.0 Safari/537.36"
+    ),
+    "Accept-Language": "fr-CA,fr;q=0.9,en;q=0.8",
+}
+
+# Taille max d'une page Centris téléchargée (même borne que les corps de requête)
+MAX_HTML_BYTES = int(os.getenv("MAX_HTML_BYTES", str(app.config["MAX_CONTENT_LENGTH"])))
+
+# Mode batch: nb de fiches téléchargées/analysées en parallèle (borné pour ne pas brusquer Centris)
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))
+# /analyze_batch: nb max d'items par requête
+ANALYZE_BATCH_MAX = int(os.getenv("ANALYZE_BATCH_MAX", "50"))
+
+# ✅ Cache des analyses par hash du HTML (même page renvoyée -> pas de ré-analyse); 0 = désactivé
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", "128"))
+_analysis_cache = OrderedDict()
+_analysis_cache_lock = threading.Lock()
+
 
 def push_to_google_form(payload: dict) -> dict:
     if not FORM_POST_URL:
@@ -57,7 +98,7 @@ def push_to_google_form(payload: dict) -> dict:
     }
 
     try:
-        resp = requests.post(
+        resp = SESSION.post(
             FORM_POST_URL,
             data=form_data,
             timeout=30,
@@ -72,24 +113,67 @@ def push_to_google_form(payload: dict) -> dict:
             "location": resp.headers.get("Location"),
             "used_url": FORM_POST_URL,
             "sent_fbzx": bool(fbzx),
-            "body": (resp.text or "")[:200],
+            # aperçu: on ne décode que le début de la page (pas tout resp.text)
+            "body": resp.content[:800].decode(resp.encoding or "utf-8", errors="replace")[:200],
         }
     except Exception as e:
         return {"ok": False, "error": str(e)}
 
 
 def fetch_html_from_url(url: str) -> str:
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/121.0.0.0 Safari/537.36"
-        ),
-        "Accept-Language": "fr-CA,fr;q=0.9,en;q=0.8",
-    }
-    resp = requests.get(url, headers=headers, timeout=30)
-    resp.raise_for_status()
-    return resp.text
+    # ✅ lecture en streaming bornée: on ne bufferise pas une réponse démesurée
+    with SESSION.get(url, headers=CENTRIS_HEADERS, timeout=30, stream=True) as resp:
+        resp.raise_for_status()
+
+        declared = resp.headers.get("Content-Length")
+        if declared and declared.isdigit() and int(declared) > MAX_HTML_BYTES:
+            raise ValueError(f"Page trop volumineuse ({declared} octets > {MAX_HTML_BYTES})")
+
+        chunks = []
+        total = 0
+        for chunk in resp.iter_content(65536):
+            total += len(chunk)
+            if total > MAX_HTML_BYTES:
+                raise ValueError(f"Page trop volumineuse (> {MAX_HTML_BYTES} octets)")
+            chunks.append(chunk)
+
+        # charset annoncé par Centris, sinon utf-8 (évite la détection chardet de resp.text)
+        return b"".join(chunks).decode(resp.encoding or "utf-8", errors="replace")
+
+
+def analyze_html(html: str) -> dict:
+    """
+    analyser_centris avec cache LRU sur le hash (blake2b) du HTML.
+    Retourne toujours une copie: les appelants peuvent modifier le dict.
+    """
+    if ANALYSIS_CACHE_SIZE <= 0:
+        return analyser_centris(html)
+
+    key = hashlib.blake2b(html.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+    with _analysis_cache_lock:
+        cached = _analysis_cache.get(key)
+        if cached is not None:
+            _analysis_cache.move_to_end(key)
+            return copy.deepcopy(cached)
+
+    data = analyser_centris(html)
+    if isinstance(data, dict):
+        with _analysis_cache_lock:
+            _analysis_cache[key] = copy.deepcopy(data)
+            while len(_analysis_cache) > ANALYSIS_CACHE_SIZE:
+                _analysis_cache.popitem(last=False)
+    return data
+
+
+def analyze_batch_url(url: str) -> dict:
+    item = {"url": url}
+    try:
+        html = fetch_html_from_url(url)
+        data = analyze_html(html)
+        item["data"] = data
+    except Exception as e:
+        item["error"] = str(e)
+    return item
 
 
 @app.route("/", methods=["GET", "POST"])
@@ -112,23 +196,17 @@ def index():
                         html = fetch_html_from_url(content)
                     else:
                         html = content
-                    result = analyser_centris(html)
+                    result = analyze_html(html)
 
             elif mode == "batch":
                 urls = [u.strip() for u in urls_text.splitlines() if u.strip()]
                 if not urls:
                     error = "Veuillez entrer au moins 1 URL."
                 else:
-                    batch_results = []
-                    for u in urls:
-                        item = {"url": u}
-                        try:
-                            html = fetch_html_from_url(u)
-                            data = analyser_centris(html)
-                            item["data"] = data
-                        except Exception as e:
-                            item["error"] = str(e)
-                        batch_results.append(item)
+                    # ✅ fetch + analyse en parallèle (I/O), résultats dans l'ordre des URLs
+                    workers = max(1, min(BATCH_WORKERS, len(urls)))
+                    with ThreadPoolExecutor(max_workers=workers) as pool:
+                        batch_results = list(pool.map(analyze_batch_url, urls))
 
         except Exception as e:
             error = f"Erreur d'analyse : {e}"
@@ -141,10 +219,32 @@ def index():
     )
 
 
-@app.route("/analyze", methods=["POST"])
-def api_analyze():
-    body = request.get_json(silent=True) or {}
+def read_json_body():
+    """
+    JSON du corps de la requête (None si absent/invalide, comme get_json(silent=True)).
+    ✅ Accepte aussi Content-Encoding: gzip (le HTML se compresse ~8-10x à l'envoi).
+    ✅ Parsing orjson (le champ HTML fait souvent plusieurs centaines de Ko).
+    """
+    if not request.is_json:
+        return None
+
+    try:
+        raw = request.get_data()
+        encoding = (request.headers.get("Content-Encoding", "") or "").strip().lower()
+        if encoding == "gzip":
+            # taille décompressée bornée comme le corps brut (anti "gzip bomb")
+            max_len = app.config["MAX_CONTENT_LENGTH"]
+            d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            raw = d.decompress(raw, max_len)
+            if d.unconsumed_tail:
+                return None
+        return orjson.loads(raw)
+    except Exception:
+        return None
 
+
+def analyze_request(body: dict):
+    """Logique de /analyze pour un item -> (payload JSON, status HTTP)."""
     url = body.get("url")
     content = body.get("content")
     html_direct = body.get("html")
@@ -163,27 +263,27 @@ def api_analyze():
         try:
             html = fetch_html_from_url(url)
         except Exception as e:
-            return jsonify({
+            return {
                 "error": "fetch_failed",
                 "source": "url",
                 "message": str(e),
                 "url": url,
-            }), 502
+            }, 502
     else:
-        return jsonify({
+        return {
             "error": "missing_input",
             "message": "Il faut fournir 'url' ou 'content' ou 'html'."
-        }), 400
+        }, 400
 
     if not html or len(html) < 2000:
-        return jsonify({
+        return {
             "error": "missing_or_too_short_html",
             "source": source,
             "len": len(html) if html else 0,
-        }), 400
+        }, 400
 
     try:
-        data = analyser_centris(html)
+        data = analyze_html(html)
 
         if isinstance(data, dict):
             data.setdefault("__analyzer_version__", "UNKNOWN")
@@ -197,14 +297,51 @@ def api_analyze():
             if body.get("push_form") is True:
                 data["_form_push"] = push_to_google_form(data)
 
-        return jsonify(data), 200
+        return data, 200
 
     except Exception as e:
-        return jsonify({
+        return {
             "error": "analyzer_exception",
             "message": str(e),
             "source": source,
-        }), 500
+        }, 500
+
+
+@app.route("/analyze", methods=["POST"])
+def api_analyze():
+    body = read_json_body() or {}
+    payload, status = analyze_request(body)
+    return jsonify(payload), status
+
+
+@app.route("/analyze_batch", methods=["POST"])
+def api_analyze_batch():
+    """
+    ✅ Plusieurs fiches en un seul POST: [{url|content|html, push_form?}, ...]
+    Réponse: liste dans le même ordre, [{"status": <code HTTP de /analyze>, "result": {...}}, ...]
+    """
+    items = read_json_body()
+    if not isinstance(items, list) or not items:
+        return jsonify({
+            "error": "missing_input",
+            "message": "Il faut fournir une liste JSON non vide d'items {url|content|html}."
+        }), 400
+    if len(items) > ANALYZE_BATCH_MAX:
+        return jsonify({
+            "error": "too_many_items",
+            "max": ANALYZE_BATCH_MAX,
+            "len": len(items),
+        }), 400
+
+    def run(item):
+        payload, status = analyze_request(item if isinstance(item, dict) else {})
+        return {"status": status, "result": payload}
+
+    workers = max(1, min(BATCH_WORKERS, len(items)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(run, items))
+
+    return jsonify(results), 200
 
 
 @app.post("/api/analyze_html")
@@ -1,10 +1,34 @@
+import os
 import re
 import json
 from typing import Any, Optional, Dict, Tuple, List, Iterable
 from bs4 import BeautifulSoup
 
+try:
+    # ✅ Parser C (lexbor), 10-30x plus rapide que html.parser; fallback BeautifulSoup si absent
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
 ANALYZER_VERSION = "v8-2025-12-28-nextdata-first+annualfix+priceheader2"
 
+# ✅ raw_debug complet seulement si CENTRIS_DEBUG=1 (sinon réponse JSON beaucoup plus légère)
+CENTRIS_DEBUG = (os.environ.get("CENTRIS_DEBUG", "") or "").strip() == "1"
+
+# ✅ Montant suivi de "$", sans backtracking catastrophique:
+# - le lookbehind ne laisse démarrer qu'au début d'une suite chiffres/espaces/séparateurs;
+# - (?=(...))\1 émule un groupe atomique: le nombre est capturé une seule fois.
+# → linéaire même sur une longue suite de chiffres sans "$" (au lieu de O(n²)).
+_RE_PRICE_DOLLAR = re.compile(
+    r"(?<![\d\s\u00a0\u202f,\.])[\s\u00a0\u202f,\.]*(?=(\d[\d\s\u00a0\u202f,\.]{2,}))\1\s*\$"
+)
+_RE_AMOUNT_DOLLAR = re.compile(r"(?<![\d\s,\.])[\s,\.]*(?=(\d[\d\s,\.]{1,}))\1\s*\$")
+# Même forme, à placer après un ".*?": le préfixe ne traverse pas de fin de ligne (comme ".")
+_ATOMIC_AMOUNT = r"(?<![\d\s,\.])(?:[^\S\n]|[,\.])*(?=(\d[\d\s,\.]{1,}))\1"
+
+_RE_NOT_MONEY_CHAR = re.compile(r"[^0-9,\.\-]")
+_RE_DECIMAL_COMMA = re.compile(r"^-?\d+,\d{2}$")
+
 
 def _money_to_int(x: Any) -> Optional[int]:
     if x is None or isinstance(x, bool):
@@ -14,15 +38,13 @@ def _money_to_int(x: Any) -> Optional[int]:
     if isinstance(x, float):
         return int(round(x))
 
-    s = str(x).replace("\u00a0", " ").replace("\u202f", " ").strip()
-    s2 = re.sub(r"[^0-9,\.\-\s]", "", s).strip()
+    # une seule passe: garde chiffres/séparateurs/signe (espaces normaux et insécables retirés d'office)
+    s2 = _RE_NOT_MONEY_CHAR.sub("", str(x))
     if not s2:
         return None
 
-    s2 = re.sub(r"\s+", "", s2)
-
     if "," in s2 and "." not in s2:
-        if re.match(r"^-?\d+,\d{2}$", s2):
+        if _RE_DECIMAL_COMMA.match(s2):
             s2 = s2.replace(",", ".")
             try:
                 return int(round(float(s2)))
@@ -56,21 +78,32 @@ def _as_int(x: Any) -> Optional[int]:
 
 
 def _clean_text_lines(html: str):
-    soup = BeautifulSoup(html or "", "html.parser")
-    lines = soup.get_text("\n", strip=True).replace("\u00a0", " ").replace("\u202f", " ").splitlines()
-    lines = [ln.strip() for ln in lines if ln.strip()]
-    return lines
+    if LexborHTMLParser is not None:
+        tree = LexborHTMLParser(html or "")
+        # même texte que get_text() de BeautifulSoup: sans le contenu des <script>/<style>
+        tree.strip_tags(["script", "style"])
+        text = tree.root.text(separator="\n", strip=True) if tree.root else ""
+    else:
+        soup = BeautifulSoup(html or "", "html.parser")
+        text = soup.get_text("\n", strip=True)
+    text = text.replace("\u00a0", " ").replace("\u202f", " ")
+    # un noeud texte peut contenir des retours de ligne internes -> strip par ligne (une seule fois)
+    return list(filter(None, map(str.strip, text.splitlines())))
+
+
+# contenu des <script type="application/ld+json">: boucle "déroulée" ([^<]* en fast-path C)
+# au lieu de (.*?) + DOTALL qui avance caractère par caractère
+_RE_JSONLD = re.compile(
+    r'<script[^>]+type="application/ld\+json"[^>]*>([^<]*(?:<(?!/script>)[^<]*)*)</script>',
+    re.IGNORECASE
+)
 
 
 def _extract_price_jsonld(html: str) -> Optional[int]:
     if not html:
         return None
 
-    scripts = re.findall(
-        r'<script[^>]+type="application/ld\+json"[^>]*>(.*?)</script>',
-        html,
-        flags=re.DOTALL | re.IGNORECASE
-    )
+    scripts = _RE_JSONLD.findall(html)
 
     for raw in scripts:
         raw = (raw or "").strip()
@@ -99,6 +132,10 @@ def _extract_price_jsonld(html: str) -> Optional[int]:
     return None
 
 
+# lignes à ignorer dans le fallback du prix visible (évaluation/taxes/dépenses)
+_RE_PRICE_IGNORE = re.compile(r"évaluation|evaluation|taxes|dépenses|depenses")
+
+
 def _extract_price_from_visible(lines) -> Optional[int]:
     """
     ✅ FIX 2 (robuste):
@@ -117,22 +154,20 @@ def _extract_price_from_visible(lines) -> Optional[int]:
 
     if idx is not None:
         win = "\n".join(lines[idx: idx + 180])
-        m = re.search(r"(\d[\d\s\u00a0\u202f,\.]{2,})\s*\$", win)
+        m = _RE_PRICE_DOLLAR.search(win)
         if m:
             p = _money_to_int(m.group(1))
             if p and 20_000 <= p <= 15_000_000:
                 return p
 
     # 2) fallback filtré (début de page)
-    ignore_markers = ("évaluation", "evaluation", "taxes", "dépenses", "depenses")
     candidates: List[int] = []
 
     for ln in lines[:350]:
-        low = ln.lower()
-        if any(k in low for k in ignore_markers):
+        if _RE_PRICE_IGNORE.search(ln.lower()):
             continue
 
-        for mm in re.finditer(r"(\d[\d\s\u00a0\u202f,\.]{2,})\s*\$", ln):
+        for mm in _RE_PRICE_DOLLAR.finditer(ln):
             p2 = _money_to_int(mm.group(1))
             if p2 and 20_000 <= p2 <= 15_000_000:
                 candidates.append(p2)
@@ -191,7 +226,7 @@ def _extract_taxes_from_tables(lines) -> Dict[str, Optional[int]]:
 
         v = _money_to_int(val_line)
         if v is None:
-            m = re.search(r"(\d[\d\s,\.]{1,})\s*\$", val_line)
+            m = _RE_AMOUNT_DOLLAR.search(val_line)
             v = _money_to_int(m.group(1)) if m else None
 
         if v is None:
@@ -226,7 +261,7 @@ def _extract_revenue_from_tables(lines) -> Optional[int]:
             val_line = scan[i + 1]
             v = _money_to_int(val_line)
             if v is None:
-                m = re.search(r"(\d[\d\s,\.]{1,})\s*\$", val_line)
+                m = _RE_AMOUNT_DOLLAR.search(val_line)
                 v = _money_to_int(m.group(1)) if m else None
             if v is not None and 0 < v < 1000:
                 v *= 1000
@@ -253,10 +288,10 @@ def _extract_revenue_from_visible(lines) -> Optional[int]:
 
     text = "\n".join(lines)
     patterns = [
-        r"revenu(?:s)?\s+brut(?:s)?\s+potentiel(?:s)?.*?(\d[\d\s,\.]{1,})\s*\$",
-        r"revenu\s+brut.*?(\d[\d\s,\.]{1,})\s*\$",
+        r"revenu(?:s)?\s+brut(?:s)?\s+potentiel(?:s)?.*?" + _ATOMIC_AMOUNT + r"\s*\$",
+        r"revenu\s+brut.*?" + _ATOMIC_AMOUNT + r"\s*\$",
         r"pot\.\s*gross\s*rev\.\s*:\s*\$?\s*(\d[\d\s,\.]{1,})",
-        r"potential\s+gross\s+revenue.*?(\d[\d\s,\.]{1,})\s*\$",
+        r"potential\s+gross\s+revenue.*?" + _ATOMIC_AMOUNT + r"\s*\$",
     ]
     v = _first_match_money(text, patterns)
     if v is None:
@@ -272,12 +307,12 @@ def _extract_taxes_from_visible(lines) -> Dict[str, Optional[int]]:
 
     text = "\n".join(lines)
     mun_patterns = [
-        r"taxes?\s+municipales?.*?(\d[\d\s,\.]{1,})\s*\$",
-        r"municipal\s+tax(?:es)?.*?(\d[\d\s,\.]{1,})\s*\$",
+        r"taxes?\s+municipales?.*?" + _ATOMIC_AMOUNT + r"\s*\$",
+        r"municipal\s+tax(?:es)?.*?" + _ATOMIC_AMOUNT + r"\s*\$",
     ]
     sco_patterns = [
-        r"taxes?\s+scolaires?.*?(\d[\d\s,\.]{1,})\s*\$",
-        r"school\s+tax(?:es)?.*?(\d[\d\s,\.]{1,})\s*\$",
+        r"taxes?\s+scolaires?.*?" + _ATOMIC_AMOUNT + r"\s*\$",
+        r"school\s+tax(?:es)?.*?" + _ATOMIC_AMOUNT + r"\s*\$",
     ]
 
     taxes_mun = table.get("taxes_municipales")
@@ -294,10 +329,14 @@ def _extract_taxes_from_visible(lines) -> Dict[str, Optional[int]]:
 def _extract_next_data(html: str) -> Tuple[Optional[dict], Optional[str]]:
     if not html:
         return None, "empty_html"
-    soup = BeautifulSoup(html, "html.parser")
-    s = soup.find("script", id="__NEXT_DATA__")
-    if s and s.string:
-        raw = s.string.strip()
+    if LexborHTMLParser is not None:
+        node = LexborHTMLParser(html).css_first("script#__NEXT_DATA__")
+        raw = node.text() if node else None
+    else:
+        s = BeautifulSoup(html, "html.parser").find("script", id="__NEXT_DATA__")
+        raw = s.string if s else None
+    if raw:
+        raw = raw.strip()
         try:
             return json.loads(raw), None
         except Exception as e:
@@ -305,14 +344,21 @@ def _extract_next_data(html: str) -> Tuple[Optional[dict], Optional[str]]:
     return None, "next_data_not_found"
 
 
-def _iter_json(obj: Any, path: Tuple[Any, ...] = ()) -> Iterable[Tuple[Tuple[Any, ...], Any]]:
+# ✅ Sous-arbres Next.js volumineux qui ne contiennent jamais prix/taxes/logements: on ne les parcourt pas
+_PRUNE_KEYS = frozenset({"i18n", "locales", "translations", "messages", "menu", "breadcrumb", "seo"})
+
+
+def _iter_json(obj: Any, path: Tuple[Any, ...] = (),
+               prune: frozenset = _PRUNE_KEYS) -> Iterable[Tuple[Tuple[Any, ...], Any]]:
     yield path, obj
     if isinstance(obj, dict):
         for k, v in obj.items():
-            yield from _iter_json(v, path + (k,))
+            if k in prune:
+                continue
+            yield from _iter_json(v, path + (k,), prune)
     elif isinstance(obj, list):
         for i, v in enumerate(obj):
-            yield from _iter_json(v, path + (i,))
+            yield from _iter_json(v, path + (i,), prune)
 
 
 def _key_match(k: str, includes: List[str], excludes: List[str] = None) -> bool:
@@ -324,42 +370,71 @@ def _key_match(k: str, includes: List[str], excludes: List[str] = None) -> bool:
     return all(inc in kk for inc in includes)
 
 
-def _find_money_in_json(next_data: dict, includes: List[str], excludes: List[str] = None,
-                        min_v: int = 0, max_v: int = 10**12) -> Tuple[Optional[int], Optional[Tuple[Any, ...]]]:
-    for path, val in _iter_json(next_data):
-        if not path:
-            continue
-        key = path[-1]
-        if not isinstance(key, str):
-            continue
-        if not _key_match(key, includes=includes, excludes=excludes or []):
-            continue
-        mv = _money_to_int(val)
-        if mv is None:
-            continue
-        if not (min_v <= mv <= max_v):
-            continue
-        return mv, path
-    return None, None
+# Spécification d'un champ à chercher dans __NEXT_DATA__:
+# (conversion, includes, excludes, min_v, max_v)
+_JsonSpec = Tuple[Any, List[str], List[str], int, int]
 
 
-def _find_int_in_json(next_data: dict, includes: List[str], excludes: List[str] = None,
-                      min_v: int = 0, max_v: int = 10**9) -> Tuple[Optional[int], Optional[Tuple[Any, ...]]]:
+def _scan_json(next_data: dict, specs: Dict[str, _JsonSpec]) -> Dict[str, Tuple[Optional[int], Optional[Tuple[Any, ...]]]]:
+    """
+    ✅ Un seul parcours de l'arbre pour tous les champs (au lieu d'un parcours complet par champ).
+    Même résultat que des recherches séparées: 1er match de chaque champ dans l'ordre de _iter_json.
+    Le parcours s'arrête dès que tous les champs sont trouvés.
+    """
+    found: Dict[str, Tuple[Optional[int], Optional[Tuple[Any, ...]]]] = {name: (None, None) for name in specs}
+    pending = dict(specs)
+    # instantané des champs restants: reconstruit seulement quand un champ est trouvé
+    pending_items = tuple(pending.items())
+
     for path, val in _iter_json(next_data):
         if not path:
             continue
         key = path[-1]
         if not isinstance(key, str):
             continue
-        if not _key_match(key, includes=includes, excludes=excludes or []):
-            continue
-        iv = _as_int(val)
-        if iv is None:
-            continue
-        if not (min_v <= iv <= max_v):
-            continue
-        return iv, path
-    return None, None
+        hit = False
+        for name, (conv, includes, excludes, min_v, max_v) in pending_items:
+            if not _key_match(key, includes=includes, excludes=excludes):
+                continue
+            v = conv(val)
+            if v is None:
+                continue
+            if not (min_v <= v <= max_v):
+                continue
+            found[name] = (v, path)
+            del pending[name]
+            hit = True
+        if hit:
+            if not pending:
+                break
+            pending_items = tuple(pending.items())
+
+    return found
+
+
+def _is_trusted_price_path(path: Optional[Tuple[Any, ...]]) -> bool:
+    """
+    True seulement pour le prix de LA fiche, chemin ancré sous props.pageProps:
+    listing.price, offers.price, offers[i].price (avec ou sans "listing." devant).
+    Tout le reste (fiches similaires, listes, autres sous-arbres) -> False: JSON-LD d'abord.
+    """
+    if not path or tuple(path[:2]) != ("props", "pageProps"):
+        return False
+    rest = [p.lower() if isinstance(p, str) else p for p in path[2:]]
+
+    has_listing = rest[:1] == ["listing"]
+    if has_listing:
+        rest = rest[1:]
+        if rest == ["price"]:
+            return True
+
+    if rest[:1] != ["offers"]:
+        return False
+    rest = rest[1:]
+    # index de liste toléré uniquement directement sous offers
+    if rest and isinstance(rest[0], int):
+        rest = rest[1:]
+    return rest == ["price"]
 
 
 def analyser_centris(html: str) -> dict:
@@ -368,18 +443,23 @@ def analyser_centris(html: str) -> dict:
     next_data, next_err = _extract_next_data(html)
     has_next = isinstance(next_data, dict)
 
-    price_jsonld = _extract_price_jsonld(html)
-
-    price_next = None
-    price_next_path = None
+    found: Dict[str, Tuple[Optional[int], Optional[Tuple[Any, ...]]]] = {}
     if has_next:
-        price_next, price_next_path = _find_money_in_json(
-            next_data,
-            includes=["price"],
-            excludes=["tax", "fee", "unit", "maintenance", "school", "municipal"],
-            min_v=20_000,
-            max_v=15_000_000
-        )
+        found = _scan_json(next_data, {
+            "price": (_money_to_int, ["price"], ["tax", "fee", "unit", "maintenance", "school", "municipal"], 20_000, 15_000_000),
+            "revenu": (_money_to_int, ["revenue"], ["tax"], 0, 200_000_000),
+            "taxes_mun": (_money_to_int, ["municipal", "tax"], [], 0, 50_000_000),
+            "taxes_sco": (_money_to_int, ["school", "tax"], [], 0, 50_000_000),
+            "units": (_as_int, ["unit"], ["suite", "community", "maintenance"], 1, 500),
+        })
+
+    price_next, price_next_path = found.get("price", (None, None))
+
+    # ✅ JSON-LD (regex + json.loads sur tout le HTML) sauté seulement si next_data
+    # donne déjà un prix fiable (offers.price / listing.price), pas un "*price*" deviné.
+    price_jsonld = None
+    if not _is_trusted_price_path(price_next_path):
+        price_jsonld = _extract_price_jsonld(html)
 
     price_visible = _extract_price_from_visible(lines)
 
@@ -415,21 +495,21 @@ def analyser_centris(html: str) -> dict:
     units_path = None
 
     if has_next:
-        revenu, revenu_path = _find_money_in_json(next_data, includes=["revenue"], excludes=["tax"], min_v=0, max_v=200_000_000)
+        revenu, revenu_path = found["revenu"]
         if revenu is not None:
             if 0 < revenu < 1000:
                 revenu *= 1000
             revenu_source = "next_data"
 
-        taxes_mun, taxes_mun_path = _find_money_in_json(next_data, includes=["municipal", "tax"], excludes=[], min_v=0, max_v=50_000_000)
+        taxes_mun, taxes_mun_path = found["taxes_mun"]
         if taxes_mun is not None:
             taxes_mun_source = "next_data"
 
-        taxes_sco, taxes_sco_path = _find_money_in_json(next_data, includes=["school", "tax"], excludes=[], min_v=0, max_v=50_000_000)
+        taxes_sco, taxes_sco_path = found["taxes_sco"]
         if taxes_sco is not None:
             taxes_sco_source = "next_data"
 
-        units, units_path = _find_int_in_json(next_data, includes=["unit"], excludes=["suite", "community", "maintenance"], min_v=1, max_v=500)
+        units, units_path = found["units"]
         if units is not None:
             units_source = "next_data"
 
@@ -472,7 +552,10 @@ def analyser_centris(html: str) -> dict:
             "taxes_municipales": taxes_mun,
             "taxes_scolaires": taxes_sco,
         },
-        "raw_debug": {
+    }
+
+    if CENTRIS_DEBUG:
+        out["raw_debug"] = {
             "has_next_data": has_next,
             "next_data_error": next_err,
             "price_jsonld": price_jsonld,
@@ -490,5 +573,6 @@ def analyser_centris(html: str) -> dict:
             "units_path": units_path,
             "lines_top_sample": lines[:25],
         }
-    }
+    else:
+        out["raw_debug"] = {"price_source": price_source}
     return out
@@ -1,8 +1,9 @@
 import os
-import json
 import re
+from functools import lru_cache
+import orjson
 import requests
-from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -15,9 +16,12 @@ CENTRIS_SEARCH_URL = os.getenv(
 
 SEEN_FILE = "seen_listings.json"
 
+_ID_RE = re.compile(r"/(\d{7,8})(?:[^\d]|$)")
 
+
+@lru_cache(maxsize=4096)
 def extract_listing_id(url: str):
-    m = re.search(r"/(\d{7,8})(?:[^\d]|$)", url)
+    m = _ID_RE.search(url)
     return m.group(1) if m else None
 
 
@@ -30,22 +34,23 @@ def get_listing_urls_from_search():
     )
     resp.raise_for_status()
 
-    soup = BeautifulSoup(resp.text, "html.parser")
+    tree = LexborHTMLParser(resp.text)
     urls = []
+    seen_ids = set()  # dédoublonnage au fil de l'eau, par ID de fiche (ordre conservé)
 
-    for a in soup.find_all("a", href=True):
-        href = a["href"]
+    for a in tree.css("a[href]"):
+        href = a.attributes.get("href") or ""
         # On prend tout ce qui ressemble à une fiche ~a-vendre
         if href.startswith("/fr/") and "~a-vendre" in href:
-            if href.startswith("http"):
-                full_url = href
-            else:
-                full_url = "https://www.centris.ca" + href
-            urls.append(full_url)
+            # même fiche = même ID, même si le slug / les paramètres diffèrent
+            full_url = "https://www.centris.ca" + href
+            lid = extract_listing_id(full_url)
+            if lid and lid not in seen_ids:
+                seen_ids.add(lid)
+                urls.append(full_url)
 
-    unique = list(dict.fromkeys(urls))
-    print(f"➡️ {len(unique)} URLs trouvées")
-    return unique
+    print(f"➡️ {len(urls)} URLs trouvées")
+    return urls
 
 
 def main():
@@ -60,8 +65,11 @@ def main():
     ids = sorted(set(ids))
     print(f"📂 {len(ids)} IDs trouvés sur la page, marqués comme 'déjà vus'.")
 
-    with open(SEEN_FILE, "w", encoding="utf-8") as f:
-        json.dump(ids, f, ensure_ascii=False, indent=2)
+    # ✅ écriture atomique: fichier temporaire puis os.replace (jamais de JSON à moitié écrit)
+    tmp_path = SEEN_FILE + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(orjson.dumps(ids))
+    os.replace(tmp_path, SEEN_FILE)
 
     print(f"✅ Fichier {SEEN_FILE} mis à jour.")
     print("✅ À partir de maintenant, le watcher ignorera ces annonces-là.")
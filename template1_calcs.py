@@ -1,5 +1,6 @@
 from __future__ import annotations
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Optional, Dict, Any
 
 
@@ -45,14 +46,21 @@ def safe_div(a: Optional[float], b: Optional[float]) -> Optional[float]:
     return a / b
 
 
-def pmt_monthly(principal: float, annual_rate: float, years: int, payments_per_year: int = 12) -> float:
+@lru_cache(maxsize=64)
+def _annuity_factor(annual_rate: float, years: int, payments_per_year: int) -> float:
+    # ✅ paiement par dollar emprunté: ne dépend que de (taux, amort, fréquence) -> mis en cache
     r = annual_rate / payments_per_year
     n = years * payments_per_year
     if n <= 0:
         return 0.0
     if r == 0:
-        return principal / n
-    return principal * (r * (1 + r) ** n) / ((1 + r) ** n - 1)
+        return 1.0 / n
+    growth = (1 + r) ** n
+    return (r * growth) / (growth - 1)
+
+
+def pmt_monthly(principal: float, annual_rate: float, years: int, payments_per_year: int = 12) -> float:
+    return principal * _annuity_factor(annual_rate, years, payments_per_year)
 
 
 def money(x: Optional[float]) -> str:
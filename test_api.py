@@ -1,5 +1,5 @@
 import requests
-import json
+import orjson
 
 API_URL = "https://centris-analyse-bot.onrender.com/analyze"
 
@@ -15,8 +15,8 @@ print("Texte brut :")
 print(resp.text)
 
 try:
-    j = resp.json()
+    j = orjson.loads(resp.content)
     print("\nJSON parsé :")
-    print(json.dumps(j, indent=2, ensure_ascii=False))
+    print(orjson.dumps(j, option=orjson.OPT_INDENT_2).decode("utf-8"))
 except Exception as e:
     print("\nImpossible de parser en JSON :", e)
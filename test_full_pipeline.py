@@ -1,28 +1,63 @@
 import os
+import time
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 
 load_dotenv()
 
 ANALYZER_URL = os.getenv("ANALYZER_URL", "https://centris-analyse-bot.onrender.com/analyze")
 DISCORD_WEBHOOK_URL = os.getenv("DISCORD_WEBHOOK_URL")
+DISCORD_MAX_TRIES = 5  # essais max si Discord répond 429
 
 CENTRIS_URL = "https://www.centris.ca/fr/quadruplex~a-vendre~quebec-la-cite-limoilou/22469257"
 
+# ✅ Sessions keep-alive: une par hôte (analyseur / Discord)
+# Analyseur: relance auto des 502/503/504 (cold start Render) et des erreurs de connexion.
+# read=0: jamais de re-POST après un timeout de lecture (analyse peut-être en cours).
+ANALYZER_RETRY = Retry(
+    total=4,
+    read=0,
+    backoff_factor=0.8,
+    status_forcelist=[502, 503, 504],
+    allowed_methods=["POST"],
+    raise_on_status=False,
+)
+ANALYZER_SESSION = requests.Session()
+ANALYZER_SESSION.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=ANALYZER_RETRY))
+
+# Discord: aucune relance auto (un POST livré puis relancé = message en double).
+# Les 429 sont gérés dans send_to_discord.
+DISCORD_SESSION = requests.Session()
+DISCORD_SESSION.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0))
+
+
+def _preview(raw: bytes, limit: int) -> str:
+    # tronque en octets; un caractère UTF-8 coupé en fin de tranche est simplement ignoré
+    return raw[:limit].decode("utf-8", errors="ignore")
+
 
 def call_analyzer(url: str):
     print(f"🔎 Appel analyseur pour : {url}")
-    resp = requests.post(
+    resp = ANALYZER_SESSION.post(
         ANALYZER_URL,
         json={"url": url},
         headers={"Content-Type": "application/json"},
         timeout=60,
     )
     print("Status analyseur :", resp.status_code)
-    print("Texte brut :", resp.text[:400], "...\n")
+    raw = resp.content
+    print("Texte brut :", _preview(raw, 400), "...\n")
 
     resp.raise_for_status()
-    return resp.json()
+    return orjson.loads(raw)
+
+
+def _fr(n) -> str:
+    # Montant à la française: 1 250 000 (espace insécable, pas de coupure de ligne dans Discord)
+    return format(n, ",.0f").replace(",", "\u00a0")
 
 
 def send_to_discord(data: dict, url: str):
@@ -30,12 +65,14 @@ def send_to_discord(data: dict, url: str):
         print("❌ DISCORD_WEBHOOK_URL manquant dans .env")
         return
 
-    overview = data.get("property_overview", {}) or {}
-    metrics = data.get("metrics", {}) or {}
-    revenus = data.get("revenus", {}) or {}
-    depenses = data.get("depenses_vraies", {}) or {}
+    overview = data.get("property_overview") or {}
+    metrics = data.get("metrics") or {}
+    revenus = data.get("revenus") or {}
 
-    titre = f"{overview.get('type_propriete', 'Propriété')} à {overview.get('ville', '')} ({overview.get('quartier', '')})"
+    # ✅ champs lus une seule fois, puis utilisés comme variables locales
+    type_propriete = overview.get("type_propriete", "Propriété")
+    ville = overview.get("ville", "")
+    quartier = overview.get("quartier", "")
     prix = overview.get("prix")
     nb_logements = overview.get("nb_logements")
 
@@ -43,17 +80,19 @@ def send_to_discord(data: dict, url: str):
     cashflow = metrics.get("cashflow_mensuel_estime")
     revenu_brut = revenus.get("revenu_brut_potentiel_annuel")
 
+    titre = f"{type_propriete} à {ville} ({quartier})"
+
     lignes = []
     lignes.append(f"🧱 **Nouvelle analyse Centris**")
     lignes.append(f"🔗 {url}")
     lignes.append("")
     lignes.append(f"🏷️ {titre}")
     if prix is not None:
-        lignes.append(f"💰 Prix demandé : **{prix:,.0f} $**".replace(",", " "))
+        lignes.append(f"💰 Prix demandé : **{_fr(prix)} $**")
     if nb_logements:
         lignes.append(f"🏠 Nombre de logements : **{nb_logements}**")
     if revenu_brut is not None:
-        lignes.append(f"💵 Revenu brut potentiel annuel : **{revenu_brut:,.0f} $**".replace(",", " "))
+        lignes.append(f"💵 Revenu brut potentiel annuel : **{_fr(revenu_brut)} $**")
 
     lignes.append("")
     lignes.append("📊 **Analyse financière (si dispo)**")
@@ -63,25 +102,37 @@ def send_to_discord(data: dict, url: str):
         lignes.append("📈 Cap rate estimé : *non calculé*")
 
     if cashflow is not None:
-        lignes.append(f"💸 Cashflow mensuel estimé : **{cashflow:,.0f} $/mois**".replace(",", " "))
+        lignes.append(f"💸 Cashflow mensuel estimé : **{_fr(cashflow)} $/mois**")
     else:
         lignes.append("💸 Cashflow mensuel estimé : *non calculé*")
 
     # Petit résumé brut JSON en bas (optionnel)
     lignes.append("")
     lignes.append("```json")
-    import json
-    lignes.append(json.dumps(data, ensure_ascii=False, indent=2)[:1500])
+    # indenté + accents lisibles (la réponse brute de jsonify est sur 1 ligne en \uXXXX)
+    lignes.append(orjson.dumps(data, option=orjson.OPT_INDENT_2).decode("utf-8")[:1500])
     lignes.append("```")
 
     content = "\n".join(lignes)
 
     print("📨 Envoi sur Discord...")
-    resp = requests.post(
-        DISCORD_WEBHOOK_URL,
-        json={"content": content},
-        timeout=30,
-    )
+    for attempt in range(1, DISCORD_MAX_TRIES + 1):
+        resp = DISCORD_SESSION.post(
+            DISCORD_WEBHOOK_URL,
+            json={"content": content},
+            timeout=30,
+        )
+        if resp.status_code != 429 or attempt == DISCORD_MAX_TRIES:
+            break
+
+        # ✅ 429: Discord donne le délai (en secondes) dans le JSON "retry_after"
+        try:
+            retry_after = float(orjson.loads(resp.content).get("retry_after", 1))
+        except Exception:
+            retry_after = 1.0
+        print(f"⏳ Discord rate limit, nouvel essai dans {retry_after:.2f}s ({attempt}/{DISCORD_MAX_TRIES})")
+        time.sleep(retry_after)
+
     print("Status Discord :", resp.status_code)
     print("Réponse Discord :", resp.text)
 